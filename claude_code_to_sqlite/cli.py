@@ -1,6 +1,16 @@
 "CLI for claude-code-to-sqlite."
+import collections
+import contextlib
+import itertools
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
+
 import click
-import sqlite_utils
 from pathlib import Path
 
 from claude_code_to_sqlite import utils
@@ -8,6 +18,17 @@ from claude_code_to_sqlite import utils
 
 DEFAULT_CLAUDE_DIR = Path.home() / ".claude" / "projects"
 
+# Number of parsed sessions to buffer before writing them in one transaction
+SAVE_BATCH_SIZE = 500
+
+# Web export conversations are sent to worker processes in chunks this size
+WEB_EXPORT_CHUNK_SIZE = 64
+
+# Imports adding at least this fraction of the sessions already stored
+# rebuild full-text search once at the end instead of letting triggers
+# update it row by row; below it, reindexing the whole table costs more
+FTS_REBUILD_FRACTION = 0.1
+
 
 @click.group()
 @click.version_option()
@@ -32,7 +53,7 @@ def cli():
 )
 @click.option(
     "--limit",
-    type=int,
+    type=click.IntRange(min=0),
     default=None,
     help="Only process the first N files",
 )
@@ -46,7 +67,20 @@ def cli():
     is_flag=True,
     help="Suppress progress output",
 )
-def sessions(db_path, session_dir, include_agents, limit, dry_run, silent):
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of processes used to parse files (default: CPU count)",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Re-import files even if they are unchanged since the last import",
+)
+def sessions(
+    db_path, session_dir, include_agents, limit, dry_run, silent, workers, force
+):
     "Import Claude Code sessions from a directory"
     if session_dir is None:
         session_dir = DEFAULT_CLAUDE_DIR
@@ -57,56 +91,130 @@ def sessions(db_path, session_dir, include_agents, limit, dry_run, silent):
             )
     session_dir = Path(session_dir)
 
-    files = utils.collect_session_files(session_dir, include_agents=include_agents)
+    jobs = utils.iter_project_session_files(
+        session_dir, include_agents=include_agents
+    )
     if limit is not None:
-        files = files[:limit]
+        # Stop walking the tree once we have enough files
+        jobs = itertools.islice(jobs, limit)
+    jobs = list(jobs)
 
-    if not files:
+    if not jobs:
         raise click.ClickException(f"No session files found in {session_dir}")
 
+    file_stats = {}
     if not dry_run:
-        db = sqlite_utils.Database(db_path)
+        db = utils.open_db(db_path)
+        ingested = {} if force else utils.load_ingested_files(db)
+        pending_jobs = []
+        for job in jobs:
+            key = _file_key(job[0])
+            if key is None or ingested.get(key[0]) != key[1:]:
+                file_stats[str(job[0])] = key
+                pending_jobs.append(job)
+        skipped = len(jobs) - len(pending_jobs)
+        jobs = pending_jobs
+        if skipped and not silent:
+            click.echo(f"Skipping {skipped} unchanged files")
+        if len(jobs) >= _fts_rebuild_min_sessions(db):
+            utils.drop_fts_triggers(db)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = _process_files(
+        jobs, workers=min(workers, len(jobs)), file_stats=file_stats
+    )
 
     session_count = 0
     message_count = 0
     errors = []
+    all_warnings = []
+    batch = []
+    done_files = []
+    # Agent files carry their parent's sessionId. Workers finish files in
+    # any order, so the file latest in path order always wins, as it does
+    # when run serially, and no rows from the files it replaces survive
+    positions = {str(job[0]): i for i, job in enumerate(jobs)}
+    owners = {}
+
+    def flush():
+        "Save the batch, then record its files and any empty ones as imported."
+        nonlocal session_count, message_count
+        if batch:
+            saved = _save_batch(db, batch, errors)
+            session_count += len(saved)
+            message_count += sum(len(m) for _, _, m in saved)
+            done_files.extend(item for item, _, _ in saved)
+        utils.record_ingested_files(
+            db, [file_stats[f] for f in done_files if file_stats.get(f)]
+        )
+        done_files.clear()
+
+    def discard(filepath, session_id):
+        "Drop an earlier file's rows for session_id, saved or still batched."
+        for i, (item, _, _) in enumerate(batch):
+            if item == filepath:
+                del batch[i]
+                # Superseded rather than failed: don't parse it again
+                done_files.append(filepath)
+                return
+        # Its session row will be replaced, but a longer file leaves
+        # messages past the end of the one replacing it
+        db.execute("DELETE FROM messages WHERE session_id = ?", [session_id])
 
     if silent:
-        for filepath in files:
-            project = _project_from_path(filepath, session_dir)
-            try:
-                session_row, message_rows, _ = utils.process_session(filepath, project)
-                if session_row:
-                    if not dry_run:
-                        utils.save_session(db, session_row, message_rows)
-                    session_count += 1
-                    message_count += len(message_rows)
-            except Exception as e:
-                errors.append({"file": str(filepath), "error": str(e)})
+        bar = contextlib.nullcontext(results)
     else:
-        all_warnings = []
-        with click.progressbar(
-            files,
-            label=f"Importing {len(files)} sessions",
+        bar = click.progressbar(
+            results,
+            length=len(jobs),
+            label=f"Importing {len(jobs)} sessions",
             show_pos=True,
-        ) as bar:
-            for filepath in bar:
-                project = _project_from_path(filepath, session_dir)
-                try:
-                    session_row, message_rows, warnings = utils.process_session(filepath, project)
-                    all_warnings.extend(warnings)
+            update_min_steps=_progress_steps(len(jobs)),
+        )
+    try:
+        with bar as results:
+            for filepath, result, error in results:
+                if error is not None:
+                    errors.append((str(filepath), error))
+                    continue
+                session_row, message_rows, warnings = result
+                all_warnings.extend(warnings)
+                if dry_run:
                     if session_row:
-                        if not dry_run:
-                            utils.save_session(db, session_row, message_rows)
                         session_count += 1
                         message_count += len(message_rows)
-                except Exception as e:
-                    errors.append({"file": str(filepath), "error": str(e)})
+                    continue
+                if not session_row:
+                    # Nothing to save, but no need to parse it again either
+                    done_files.append(str(filepath))
+                    continue
+                session_id = session_row["session_id"]
+                owner = owners.get(session_id)
+                if owner is not None:
+                    if positions[owner] > positions[str(filepath)]:
+                        done_files.append(str(filepath))
+                        continue
+                    discard(owner, session_id)
+                owners[session_id] = str(filepath)
+                batch.append((str(filepath), session_row, message_rows))
+                if len(batch) >= SAVE_BATCH_SIZE:
+                    flush()
+            if not dry_run:
+                flush()
+                utils.record_errors(db, "sessions", errors)
+    finally:
+        if not dry_run:
+            # Also on failure, so FTS triggers dropped above are put back
+            utils.ensure_db_shape(db)
+
+    if not silent:
         for w in all_warnings:
             click.echo(w, err=True)
 
     if not dry_run:
-        utils.ensure_db_shape(db)
+        # Closing checkpoints the WAL so the reported file size is accurate
+        db.conn.close()
 
     if not silent:
         click.echo(f"{session_count} sessions, {message_count:,} messages")
@@ -127,7 +235,7 @@ def sessions(db_path, session_dir, include_agents, limit, dry_run, silent):
 @click.option("--project", default=None, help="Project name for this session")
 def session(db_path, session_file, project):
     "Import a single session file"
-    db = sqlite_utils.Database(db_path)
+    db = utils.open_db(db_path)
     filepath = Path(session_file)
 
     session_row, message_rows, warnings = utils.process_session(filepath, project)
@@ -156,48 +264,72 @@ def session(db_path, session_file, project):
     is_flag=True,
     help="Suppress progress output",
 )
-def web_export(db_path, zip_path, silent):
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes used to parse conversations (default: 1)",
+)
+def web_export(db_path, zip_path, silent, workers):
     "Import conversations from a claude.ai data export ZIP"
-    conversations = utils.load_web_export(zip_path)
-    if not conversations:
+    conversations = utils.iter_web_export(zip_path)
+    try:
+        first = next(conversations, None)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if first is None:
         raise click.ClickException("No conversations found in export")
+    conversations = itertools.chain([first], conversations)
 
-    db = sqlite_utils.Database(db_path)
+    db = utils.open_db(db_path)
+    # The conversation count isn't known up front when streaming, so the
+    # triggers are only dropped once enough conversations have been saved
+    fts_rebuild_min = _fts_rebuild_min_sessions(db)
     session_count = 0
     message_count = 0
     errors = []
+    batch = []
+
+    def flush():
+        "Save the batch, dropping FTS triggers first if the import is now large."
+        nonlocal session_count, message_count, fts_rebuild_min
+        if fts_rebuild_min and session_count + len(batch) >= fts_rebuild_min:
+            utils.drop_fts_triggers(db)
+            fts_rebuild_min = None
+        saved = _save_batch(db, batch, errors)
+        session_count += len(saved)
+        message_count += sum(len(m) for _, _, m in saved)
+
+    results = _process_conversations(conversations, zip_path, workers=workers)
 
     if silent:
-        for conv in conversations:
-            try:
-                session_row, message_rows = utils.process_web_conversation(
-                    conv, zip_path=zip_path
-                )
-                if session_row:
-                    utils.save_session(db, session_row, message_rows)
-                    session_count += 1
-                    message_count += len(message_rows)
-            except Exception as e:
-                errors.append({"uuid": conv.get("uuid", "?"), "error": str(e)})
+        bar = contextlib.nullcontext(results)
     else:
-        with click.progressbar(
-            conversations,
-            label=f"Importing {len(conversations)} conversations",
+        bar = click.progressbar(
+            results,
+            label="Importing conversations",
             show_pos=True,
-        ) as bar:
-            for conv in bar:
-                try:
-                    session_row, message_rows = utils.process_web_conversation(
-                        conv, zip_path=zip_path
-                    )
-                    if session_row:
-                        utils.save_session(db, session_row, message_rows)
-                        session_count += 1
-                        message_count += len(message_rows)
-                except Exception as e:
-                    errors.append({"uuid": conv.get("uuid", "?"), "error": str(e)})
-
-    utils.ensure_db_shape(db)
+            update_min_steps=WEB_EXPORT_CHUNK_SIZE,
+        )
+    try:
+        with bar as results:
+            for uuid, result, error in results:
+                if error is not None:
+                    errors.append((uuid, error))
+                    continue
+                session_row, message_rows = result
+                if not session_row:
+                    continue
+                batch.append((uuid, session_row, message_rows))
+                if len(batch) >= SAVE_BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        utils.record_errors(db, "web-export", errors)
+    finally:
+        # Also on failure, so FTS triggers dropped by flush() are put back
+        utils.ensure_db_shape(db)
+    db.conn.close()
 
     if not silent:
         click.echo(f"{session_count} conversations, {message_count:,} messages")
@@ -215,7 +347,7 @@ def web_export(db_path, zip_path, silent):
 )
 def stats(db_path):
     "Show statistics about a Claude Code SQLite database"
-    db = sqlite_utils.Database(db_path)
+    db = utils.open_db(db_path, readonly=True)
 
     table_names = db.table_names()
     if "sessions" not in table_names:
@@ -223,14 +355,25 @@ def stats(db_path):
 
     has_messages = "messages" in table_names
 
-    session_count = db.execute("SELECT count(*) FROM sessions").fetchone()[0]
-    message_count = (
-        db.execute("SELECT count(*) FROM messages").fetchone()[0]
-        if has_messages else 0
-    )
-    total_tokens = db.execute(
-        "SELECT coalesce(sum(total_tokens), 0) FROM sessions"
-    ).fetchone()[0]
+    # All the scalar totals in one round trip
+    message_count_sql = "(SELECT count(*) FROM messages)" if has_messages else "0"
+    session_count, total_tokens, message_count, first_start, last_end = db.execute(
+        f"""
+        WITH s AS (
+            SELECT count(*) AS n, coalesce(sum(total_tokens), 0) AS tokens
+            FROM sessions
+        ),
+        d AS (
+            -- Separate subqueries let each aggregate seek its own index
+            SELECT
+                (SELECT min(start_time) FROM sessions) AS first_start,
+                (SELECT max(end_time) FROM sessions
+                 WHERE start_time IS NOT NULL) AS last_end
+        )
+        SELECT s.n, s.tokens, {message_count_sql}, d.first_start, d.last_end
+        FROM s, d
+        """
+    ).fetchone()
 
     click.echo(f"Sessions:  {session_count:,}")
     click.echo(f"Messages:  {message_count:,}")
@@ -259,21 +402,176 @@ def stats(db_path):
             click.echo(f"  {count:>7}  {model}")
 
     # Date range
-    date_range = db.execute(
-        "SELECT min(start_time), max(end_time) FROM sessions "
-        "WHERE start_time IS NOT NULL"
-    ).fetchone()
-    if date_range[0]:
-        start = date_range[0][:10] if date_range[0] else "?"
-        end = date_range[1][:10] if date_range[1] else "?"
+    if first_start:
+        start = first_start[:10]
+        end = last_end[:10] if last_end else "?"
         click.echo(f"\nDate range: {start} to {end}")
 
 
-def _project_from_path(filepath, session_dir):
-    "Determine project name from a session file's location in the directory tree."
+def _file_key(filepath):
+    "Return (path, size, mtime_ns) used to spot unchanged files, or None."
     try:
-        rel = filepath.relative_to(session_dir)
-        project_dir = rel.parts[0] if len(rel.parts) > 1 else "default"
-        return utils.dir_to_project(project_dir)
-    except (ValueError, IndexError):
-        return "unknown"
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return os.path.abspath(filepath), st.st_size, st.st_mtime_ns
+
+
+def _fts_rebuild_min_sessions(db):
+    """Sessions an import must save before rebuilding FTS beats its triggers.
+
+    Messages aren't counted until files are parsed, so sessions stand in
+    for the size of the import relative to what is already stored.
+    """
+    existing = db["sessions"].count if db["sessions"].exists() else 0
+    return max(1, int(existing * FTS_REBUILD_FRACTION))
+
+
+def _progress_steps(total):
+    "Items per progress bar redraw, so the bar redraws at most ~500 times."
+    return max(1, total // 500)
+
+
+def _save_batch(db, batch, errors):
+    """Save buffered (item, session_row, message_rows) tuples and clear the batch.
+
+    Returns the items that were saved. If the batched write fails, each
+    item is retried on its own and failures are appended to errors as
+    (item, message) tuples.
+    """
+    try:
+        utils.save_sessions(
+            db,
+            [session_row for _, session_row, _ in batch],
+            [m for _, _, message_rows in batch for m in message_rows],
+        )
+        saved = list(batch)
+    except Exception:
+        saved = []
+        for item, session_row, message_rows in batch:
+            try:
+                utils.save_session(db, session_row, message_rows)
+                saved.append((item, session_row, message_rows))
+            except Exception as e:
+                errors.append((item, str(e)))
+    batch.clear()
+    return saved
+
+
+def _process_file(job):
+    "Parse one (filepath, project) job, returning (filepath, result, error)."
+    filepath, project = job
+    try:
+        return filepath, utils.process_session(filepath, project), None
+    except Exception as e:
+        return filepath, None, str(e)
+
+
+def _file_size(job, file_stats=None):
+    """Size of a job's file in bytes, or 0 if it can't be read.
+
+    file_stats maps paths to the _file_key results already taken for them.
+    """
+    if file_stats is not None and str(job[0]) in file_stats:
+        key = file_stats[str(job[0])]
+        return key[1] if key else 0
+    try:
+        return os.path.getsize(job[0])
+    except OSError:
+        return 0
+
+
+def _process_files(jobs, workers=1, file_stats=None):
+    """Yield _process_file results, fanning out to processes if workers > 1.
+
+    Results come back in job order when run serially. The pool is handed
+    the largest files first, one at a time, so a single huge transcript
+    picked up at the end can't leave the other workers idle. Only a few
+    files are in flight at once, so parsed results never pile up ahead
+    of the writer, and they are yielded as they finish: the big files
+    at the head of the queue don't hold up the small ones behind them.
+    Callers that need a stable outcome can't rely on result order.
+
+    file_stats is passed to _file_size so files aren't stat()ed twice.
+    """
+    if workers > 1:
+        jobs = sorted(
+            jobs, key=lambda job: _file_size(job, file_stats), reverse=True
+        )
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from _imap(
+                executor, _process_file, jobs, window=workers * 2, ordered=False
+            )
+    else:
+        yield from map(_process_file, jobs)
+
+
+def _imap(executor, fn, items, window, ordered=True):
+    """Like executor.map, but never has more than window tasks in flight.
+
+    With ordered=False results are yielded as they complete, so one slow
+    task doesn't stop the rest of the window from draining behind it.
+    """
+    if not ordered:
+        pending = set()
+        for item in items:
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(fn, item))
+        for future in as_completed(pending):
+            yield future.result()
+        return
+    pending = collections.deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _chunks(iterable, size):
+    "Split an iterable into lists of up to size items."
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _process_conversation_chunk(job):
+    "Process a (conversations, zip_path, file_size) job into result triples."
+    conversations, zip_path, file_size = job
+    results = []
+    for conv in conversations:
+        uuid = conv.get("uuid", "?")
+        try:
+            result = utils.process_web_conversation(
+                conv, zip_path=zip_path, file_size=file_size
+            )
+            results.append((uuid, result, None))
+        except Exception as e:
+            results.append((uuid, None, str(e)))
+    return results
+
+
+def _process_conversations(conversations, zip_path, workers=1):
+    """Yield (uuid, result, error) for each conversation, in order.
+
+    Conversations are processed in chunks, across worker processes when
+    workers > 1 and there is more than one chunk. Only a few chunks are
+    in flight at once, so streamed exports are never held in memory whole.
+    """
+    chunks = _chunks(conversations, WEB_EXPORT_CHUNK_SIZE)
+    head = list(itertools.islice(chunks, 2))
+    file_size = os.path.getsize(zip_path)
+    jobs = ((chunk, zip_path, file_size) for chunk in itertools.chain(head, chunks))
+    if workers > 1 and len(head) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for results in _imap(
+                executor, _process_conversation_chunk, jobs, window=workers * 2
+            ):
+                yield from results
+    else:
+        for job in jobs:
+            yield from _process_conversation_chunk(job)
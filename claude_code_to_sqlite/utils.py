@@ -1,70 +1,142 @@
 "Parsing and SQLite insertion logic for Claude Code session transcripts."
 import json
+import os
 import re
+import sqlite3
+import sys
 import zipfile
+from operator import itemgetter
 from pathlib import Path
 
+import sqlite_utils
+from sqlite_utils.db import jsonify_if_needed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# orjson parses bytes directly and is several times faster than stdlib json
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 # Max uncompressed size we'll load from a ZIP (500 MB)
 MAX_ZIP_ENTRY_BYTES = 500 * 1024 * 1024
 
+# Shared read-only default for .get() lookups; never mutate it
+_EMPTY = {}
+
+
+def _intern(value):
+    "Intern a string that repeats across many rows; leave other values alone."
+    return sys.intern(value) if type(value) is str else value
+
+
+# Longest content/thinking text stored per message, in characters
+MAX_CONTENT_CHARS = 100_000
+
+# Read buffer for streaming JSONL files line by line (1 MB)
+READ_BUFFER_BYTES = 1024 * 1024
+
 
 # --- File filtering ---
 
-SKIP_PATTERNS = [
-    re.compile(r"[\\/](?:subagents?)[\\/]"),
-    re.compile(r"[\\/]processing[\\/]"),
-]
+# Every skip rule as one alternation, matched against the POSIX path. The
+# [^/]*$ and (?:^|/) anchors confine the name rules to the final component.
+_SKIP_RULES = (
+    r"[\\/](?:subagents?|processing)[\\/]"
+    r"|\.timelines"
+    r"|(?:\.backup| copy|\(1\))[^/]*$"
+    # Claude Code metadata files that aren't session transcripts
+    r"|(?:^|/)(?:sessions-index|timeline)\.json$"
+)
+_SKIP_RE = re.compile(_SKIP_RULES)
+_SKIP_AGENTS_RE = re.compile(_SKIP_RULES + r"|(?:^|/)agent-[^/]*$")
 
 
 def should_skip_file(filepath, include_agents=False):
-    "Return True if this file should not be ingested."
-    s = filepath.as_posix()
-    for pat in SKIP_PATTERNS:
-        if pat.search(s):
-            return True
-    name = filepath.name
-    if not include_agents and name.startswith("agent-"):
-        return True
-    if ".backup" in name:
-        return True
-    if " copy" in name or "(1)" in name:
-        return True
-    # Skip Claude Code metadata files that aren't session transcripts
-    if name in ("sessions-index.json", "timeline.json"):
-        return True
-    # Skip files inside .timelines directories
-    if ".timelines" in filepath.as_posix():
-        return True
-    return False
+    "Return True if this file (a Path or str path) should not be ingested."
+    path = os.fspath(filepath)
+    if os.sep != "/":
+        path = path.replace(os.sep, "/")
+    pattern = _SKIP_RE if include_agents else _SKIP_AGENTS_RE
+    return pattern.search(path) is not None
+
+
+SESSION_FILE_SUFFIXES = (".jsonl", ".json")
+
+# Directories whose files should_skip_file would reject anyway
+SKIP_DIR_NAMES = frozenset(("subagent", "subagents", "processing", ".timelines"))
+
+
+def _sorted_entries(path):
+    "Directory entries of path sorted by name, reversed for use as a stack."
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name, reverse=True)
+    except OSError:
+        return []
+    return entries
+
+
+def iter_project_session_files(data_path, include_agents=False):
+    """Yield (filepath, project) for session files in a directory tree.
+
+    Walks the tree with os.scandir so type checks use the cached
+    directory entries, never descends into skipped directories, and
+    yields files in sorted path order. The project is decoded from the
+    top-level directory a file lives under, or "default" for files
+    directly inside data_path.
+    """
+    # Entries directly under data_path carry project None until resolved
+    stack = [(entry, None) for entry in _sorted_entries(data_path)]
+    while stack:
+        entry, project = stack.pop()
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name not in SKIP_DIR_NAMES:
+                if project is None:
+                    project = dir_to_project(entry.name)
+                stack.extend((child, project) for child in _sorted_entries(entry.path))
+        elif entry.name.endswith(SESSION_FILE_SUFFIXES) and entry.is_file():
+            # Only files that survive the skip rules become Path objects
+            if not should_skip_file(entry.path, include_agents=include_agents):
+                yield Path(entry.path), project if project is not None else "default"
+
+
+def iter_session_files(data_path, include_agents=False):
+    "Yield JSONL/JSON session files from a directory tree in sorted order."
+    for filepath, _ in iter_project_session_files(data_path, include_agents):
+        yield filepath
 
 
 def collect_session_files(data_path, include_agents=False):
     "Collect JSONL/JSON session files from a directory tree."
-    data_path = Path(data_path)
-    files = sorted(
-        list(data_path.rglob("*.jsonl")) + list(data_path.rglob("*.json"))
-    )
-    kept = []
-    for f in files:
-        if not should_skip_file(f, include_agents=include_agents):
-            kept.append(f)
-    return kept
+    return list(iter_session_files(data_path, include_agents=include_agents))
 
 
 # --- JSONL parsing with corruption recovery ---
 
+# Where a record starts inside a line holding several concatenated records
+_BAD_LINE_RE = re.compile(r'\{"(?:parentUuid"|type":)')
+
+
 def _extract_records_from_bad_line(line):
     "Try to extract valid JSON records from a corrupted/concatenated line."
-    starts = [m.start() for m in re.finditer(r'\{"parentUuid"', line)]
-    starts += [m.start() for m in re.finditer(r'\{"type":', line)]
-    starts = sorted(set(starts))
+    # One left-to-right scan yields sorted, unique start positions
+    starts = [m.start() for m in _BAD_LINE_RE.finditer(line)]
     if not starts:
         return []
+    starts.append(len(line))
     valid = []
-    for i in range(len(starts)):
-        start = starts[i]
-        end = starts[i + 1] if i + 1 < len(starts) else len(line)
+    for start, end in zip(starts, starts[1:]):
         segment = line[start:end].strip()
+        # A truncated object can't parse, so don't pay for the exception
+        if not segment.endswith("}"):
+            continue
         try:
             valid.append(json.loads(segment))
         except json.JSONDecodeError:
@@ -72,38 +144,78 @@ def _extract_records_from_bad_line(line):
     return valid
 
 
-def load_session_file(filepath):
-    "Load a session file (JSONL or JSON) and return (records, warnings)."
+# File history snapshots are among the largest lines in a transcript and
+# process_session drops them, so they are recognised before parsing
+_SNAPSHOT_PREFIXES = (
+    b'{"type":"file-history-snapshot"',
+    b'{"type": "file-history-snapshot"',
+)
+_RECORD_START_BYTES_RE = re.compile(rb'\{"(?:parentUuid"|type":)')
+
+
+def iter_session_records(filepath, warnings):
+    "Yield records from a session file (JSONL or JSON), appending to warnings."
     filepath = Path(filepath)
 
     if filepath.suffix == ".json":
-        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-            data = json.load(f)
+        with open(filepath, "rb") as f:
+            raw = f.read()
+        try:
+            data = _json_loads(raw)
+        except ValueError:
+            data = json.loads(raw.decode("utf-8", errors="replace"))
         if isinstance(data, dict) and "loglines" in data:
-            return data["loglines"], []
-        if isinstance(data, list):
-            return data, []
-        return [data], []
+            yield from data["loglines"]
+        elif isinstance(data, list):
+            yield from data
+        else:
+            yield data
+        return
 
     # JSONL format (CLI sessions)
-    records = []
-    warnings = []
-    with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+    with open(filepath, "rb", buffering=READ_BUFFER_BYTES) as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
             if not line:
                 continue
+            # Unless it is truncated or another record was concatenated
+            # onto it, stand in a bare placeholder for a snapshot instead
+            # of parsing it
+            if (
+                line.startswith(_SNAPSHOT_PREFIXES)
+                and line.endswith(b"}")
+                and not _RECORD_START_BYTES_RE.search(line, 1)
+            ):
+                yield {"type": "file-history-snapshot"}
+                continue
             try:
-                records.append(json.loads(line))
+                yield _json_loads(line)
+                continue
+            except ValueError:
+                pass
+            # Slow path: tolerate bad UTF-8 and concatenated records
+            line = line.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
             except json.JSONDecodeError:
                 extracted = _extract_records_from_bad_line(line)
                 if extracted:
-                    records.extend(extracted)
+                    yield from extracted
                 else:
                     warnings.append(
                         f"{filepath.name} line {line_num}: "
                         "unrecoverable JSON parse error"
                     )
+                continue
+            yield record
+
+
+def load_session_file(filepath):
+    "Load a session file (JSONL or JSON) and return (records, warnings)."
+    warnings = []
+    records = list(iter_session_records(filepath, warnings))
     return records, warnings
 
 
@@ -111,18 +223,19 @@ def load_session_file(filepath):
 
 def _base64_decoded_size_kb(encoded_len):
     "Estimate decoded size in KB from base64 encoded character count."
-    return (encoded_len * 3 / 4) / 1024
+    return encoded_len * 3 / 4096
 
 
 def replace_base64_content(content):
     "Replace base64 image/document data with a size placeholder."
     if isinstance(content, str):
-        if "base64" in content[:500] and len(content) > 1000:
+        # Length first: most strings are short, and find() avoids a slice
+        if len(content) > 1000 and content.find("base64", 0, 500) != -1:
             size_kb = _base64_decoded_size_kb(len(content))
             return f"[base64 content, ~{size_kb:.0f}KB decoded]"
         return content
     if isinstance(content, dict):
-        source = content.get("source", {})
+        source = content.get("source", _EMPTY)
         if source.get("type") == "base64":
             data = source.get("data", "")
             size_kb = _base64_decoded_size_kb(len(data))
@@ -133,8 +246,8 @@ def replace_base64_content(content):
     if isinstance(content, list):
         parts = []
         for item in content:
-            if isinstance(item, dict):
-                source = item.get("source", {})
+            if type(item) is dict:
+                source = item.get("source", _EMPTY)
                 if source.get("type") == "base64":
                     data = source.get("data", "")
                     size_kb = _base64_decoded_size_kb(len(data))
@@ -151,67 +264,112 @@ def replace_base64_content(content):
     return str(content)
 
 
-def extract_text(raw_content):
-    "Extract readable text from message content (string or content blocks)."
+def extract_all(raw_content, role=None, limit=None):
+    """Extract everything process_session needs from one pass over content.
+
+    Returns (text, thinking, tool_calls, tool_use_id, is_tool_result), where
+    tool_use_id and is_tool_result describe the first tool_result block.
+    Thinking is only collected when role is None or "assistant".
+    With a limit, text and thinking are cut off at limit characters, the
+    same result as truncating the full strings, without building the rest.
+    """
     if raw_content is None:
-        return ""
+        return "", None, [], None, False
     if isinstance(raw_content, str):
-        return raw_content
-    if isinstance(raw_content, list):
-        parts = []
-        for block in raw_content:
-            if isinstance(block, dict):
-                btype = block.get("type")
-                if btype == "text":
-                    parts.append(block.get("text", ""))
-                elif btype == "thinking":
-                    pass  # extracted separately
-                elif btype == "tool_use":
-                    parts.append(f"[tool_use: {block.get('name', '')}]")
-                elif btype == "tool_result":
-                    result = block.get("content", "")
-                    result = replace_base64_content(result)
-                    if isinstance(result, list):
-                        result = "\n".join(
-                            b.get("text", str(b)) for b in result
-                        )
-                    parts.append(str(result))
-                elif btype in ("image", "document"):
-                    parts.append(replace_base64_content(block))
-                else:
-                    parts.append(str(block))
+        return raw_content, None, [], None, False
+    if not isinstance(raw_content, list):
+        return str(raw_content), None, [], None, False
+
+    want_thinking = role is None or role == "assistant"
+    parts = []
+    thinking = []
+    calls = []
+    tool_use_id = None
+    is_tool_result = False
+    # Joined lengths so far; -1 because the first part has no separator
+    text_len = thinking_len = -1
+    text_full = thinking_full = False
+    for block in raw_content:
+        # Parsed JSON only ever produces plain dicts; skip the isinstance MRO walk
+        if type(block) is not dict:
+            if text_full:
+                continue
+            part = str(block)
+        else:
+            btype = block.get("type")
+            if btype == "thinking":
+                if want_thinking and not thinking_full:
+                    text = block.get("thinking", "")
+                    if text:
+                        if limit is not None:
+                            room = limit - thinking_len - 1
+                            if len(text) >= room:
+                                text = text[:room]
+                                thinking_full = True
+                            thinking_len += len(text) + 1
+                        thinking.append(text)
+                continue
+            if btype == "tool_use":
+                name = block.get("name", "")
+                calls.append({
+                    "id": block.get("id", ""),
+                    "name": name,
+                    "input": block.get("input", {}),
+                })
+                if text_full:
+                    continue
+                part = f"[tool_use: {name}]"
+            elif btype == "tool_result":
+                if not is_tool_result:
+                    tool_use_id = block.get("tool_use_id")
+                    is_tool_result = True
+                if text_full:
+                    continue
+                result = block.get("content", "")
+                result = replace_base64_content(result)
+                if isinstance(result, list):
+                    result = "\n".join(
+                        b.get("text", str(b)) for b in result
+                    )
+                part = str(result)
+            elif text_full:
+                continue
+            elif btype == "text":
+                part = block.get("text", "")
+            elif btype in ("image", "document"):
+                part = replace_base64_content(block)
             else:
-                parts.append(str(block))
-        return "\n".join(parts)
-    return str(raw_content)
+                part = str(block)
+        if limit is not None:
+            # Cut the part that crosses the limit so the join stays small
+            room = limit - text_len - 1
+            if len(part) >= room:
+                part = part[:room]
+                text_full = True
+            text_len += len(part) + 1
+        parts.append(part)
+    return (
+        "\n".join(parts),
+        "\n".join(thinking) if thinking else None,
+        calls,
+        tool_use_id,
+        is_tool_result,
+    )
+
+
+def extract_text(raw_content):
+    "Extract readable text from message content (string or content blocks)."
+    return extract_all(raw_content)[0]
 
 
 def extract_thinking(raw_content):
     "Extract thinking/reasoning text from content blocks."
-    if not isinstance(raw_content, list):
-        return None
-    parts = []
-    for block in raw_content:
-        if isinstance(block, dict) and block.get("type") == "thinking":
-            text = block.get("thinking", "")
-            if text:
-                parts.append(text)
-    return "\n".join(parts) if parts else None
+    return extract_all(raw_content)[1]
 
 
 def extract_tool_calls(raw_content):
     "Extract tool call info from assistant content blocks."
-    if not isinstance(raw_content, list):
-        return []
-    calls = []
-    for block in raw_content:
-        if isinstance(block, dict) and block.get("type") == "tool_use":
-            calls.append({
-                "id": block.get("id", ""),
-                "name": block.get("name", ""),
-                "input": block.get("input", {}),
-            })
-    return calls
+    return extract_all(raw_content)[2]
 
 
 def dir_to_project(dirname):
@@ -231,17 +389,17 @@ def dir_to_project(dirname):
 def process_session(filepath, project=None):
     "Process a single session file into (session_dict, message_dicts, warnings)."
     filepath = Path(filepath)
-    records, warnings = load_session_file(filepath)
-    if not records:
-        return None, [], warnings
-
+    warnings = []
     session_id = None
     summary = None
     custom_title = None
     models = set()
     total_input_tokens = 0
     total_output_tokens = 0
-    timestamps = []
+    start_time = None
+    end_time = None
+    user_count = 0
+    assistant_count = 0
     cwd = None
     client_version = None
     permission_mode = None
@@ -249,94 +407,100 @@ def process_session(filepath, project=None):
     msg_index = 0
     source = "cli"
 
-    for record in records:
-        rtype = record.get("type")
+    # Records are consumed as they are parsed; no per-file list is built
+    for record in iter_session_records(filepath, warnings):
+        # Bound methods save an attribute lookup on every field access
+        rget = record.get
+        # Roles, types and models repeat on every row: intern them so rows
+        # share one string each, which pickle also sends back only once
+        rtype = _intern(rget("type"))
 
         # Detect browser export format (has metadata record with source field)
-        if rtype == "metadata" and record.get("source") == "browser_export":
+        if rtype == "metadata" and rget("source") == "browser_export":
             source = "browser"
-            session_id = record.get("original_uuid", filepath.stem)
-            custom_title = record.get("name")
+            session_id = rget("original_uuid", filepath.stem)
+            custom_title = rget("name")
+            continue
+
+        # Snapshots are usually skipped unparsed (see iter_session_records),
+        # so read nothing from them here either: both paths must agree
+        if rtype == "file-history-snapshot":
+            if not session_id:
+                session_id = filepath.stem
             continue
 
         # Session-level metadata
         if not session_id:
-            session_id = record.get("sessionId", filepath.stem)
+            session_id = rget("sessionId", filepath.stem)
         if not cwd:
-            cwd = record.get("cwd")
+            cwd = rget("cwd")
         if not client_version:
-            client_version = record.get("version")
-        if not permission_mode and record.get("permissionMode"):
+            client_version = rget("version")
+        if not permission_mode and rget("permissionMode"):
             permission_mode = record["permissionMode"]
 
-        ts = record.get("timestamp")
+        ts = rget("timestamp")
         if ts:
-            timestamps.append(ts)
+            if start_time is None or ts < start_time:
+                start_time = ts
+            if end_time is None or ts > end_time:
+                end_time = ts
 
         if rtype == "summary":
-            summary = record.get("summary", "")
+            summary = rget("summary", "")
             continue
 
         if rtype == "custom-title":
-            custom_title = record.get("customTitle", "")
-            continue
-
-        # Skip bulky snapshots from messages table
-        if rtype == "file-history-snapshot":
+            custom_title = rget("customTitle", "")
             continue
 
-        msg = record.get("message", {})
-        role = msg.get("role") or rtype or "unknown"
-        raw_content = msg.get("content") or record.get("content", "")
-        model = msg.get("model")
+        msg = rget("message", _EMPTY)
+        mget = msg.get
+        role = _intern(mget("role")) or rtype or "unknown"
+        raw_content = mget("content") or rget("content", "")
+        model = _intern(mget("model"))
 
         if model:
             models.add(model)
-
-        usage = msg.get("usage", {})
-        input_tokens = usage.get("input_tokens", 0)
-        output_tokens = usage.get("output_tokens", 0)
-        cache_read = usage.get("cache_read_input_tokens", 0)
-        cache_create = usage.get("cache_creation_input_tokens", 0)
+        if role == "user":
+            user_count += 1
+        elif role == "assistant":
+            assistant_count += 1
+
+        uget = mget("usage", _EMPTY).get
+        input_tokens = uget("input_tokens", 0)
+        output_tokens = uget("output_tokens", 0)
+        cache_read = uget("cache_read_input_tokens", 0)
+        cache_create = uget("cache_creation_input_tokens", 0)
         total_input_tokens += input_tokens
         total_output_tokens += output_tokens
 
-        content_text = extract_text(raw_content)
-        thinking = extract_thinking(raw_content) if role == "assistant" else None
-
-        tool_calls = extract_tool_calls(raw_content)
+        content_text, thinking, tool_calls, tool_use_id, is_tool_result = (
+            extract_all(raw_content, role, limit=MAX_CONTENT_CHARS)
+        )
         tool_names = [tc["name"] for tc in tool_calls] if tool_calls else None
 
-        tool_use_id = None
-        is_tool_result = False
-        if isinstance(raw_content, list):
-            for block in raw_content:
-                if isinstance(block, dict) and block.get("type") == "tool_result":
-                    tool_use_id = block.get("tool_use_id")
-                    is_tool_result = True
-                    break
-
         message_rows.append({
             "session_id": session_id,
             "message_index": msg_index,
             "role": role,
-            "content": content_text[:100_000] if content_text else "",
-            "thinking": thinking[:100_000] if thinking else None,
+            "content": content_text[:MAX_CONTENT_CHARS] if content_text else "",
+            "thinking": thinking[:MAX_CONTENT_CHARS] if thinking else None,
             "timestamp": ts,
-            "uuid": record.get("uuid"),
-            "parent_uuid": record.get("parentUuid"),
+            "uuid": rget("uuid"),
+            "parent_uuid": rget("parentUuid"),
             "model": model,
             "record_type": rtype,
             "tool_names": json.dumps(tool_names) if tool_names else None,
             "tool_use_id": tool_use_id,
             "is_tool_result": is_tool_result,
-            "is_sidechain": record.get("isSidechain", False),
+            "is_sidechain": rget("isSidechain", False),
             "input_tokens": input_tokens or None,
             "output_tokens": output_tokens or None,
             "cache_read_tokens": cache_read or None,
             "cache_create_tokens": cache_create or None,
-            "stop_reason": record.get("stopReason") or msg.get("stop_reason"),
-            "duration_ms": record.get("durationMs"),
+            "stop_reason": rget("stopReason") or mget("stop_reason"),
+            "duration_ms": rget("durationMs"),
         })
         msg_index += 1
 
@@ -352,11 +516,11 @@ def process_session(filepath, project=None):
         "models": json.dumps(sorted(models)) if models else None,
         "summary": summary,
         "custom_title": custom_title,
-        "start_time": min(timestamps) if timestamps else None,
-        "end_time": max(timestamps) if timestamps else None,
+        "start_time": start_time,
+        "end_time": end_time,
         "message_count": len(message_rows),
-        "user_message_count": sum(1 for m in message_rows if m["role"] == "user"),
-        "assistant_message_count": sum(1 for m in message_rows if m["role"] == "assistant"),
+        "user_message_count": user_count,
+        "assistant_message_count": assistant_count,
         "total_input_tokens": total_input_tokens,
         "total_output_tokens": total_output_tokens,
         "total_tokens": total_input_tokens + total_output_tokens,
@@ -370,77 +534,143 @@ def process_session(filepath, project=None):
 
 # --- Web export (claude.ai ZIP) processing ---
 
+def _find_conversations_json(zf, zip_path):
+    "Return the ZipInfo for conversations.json, searching the whole archive."
+    for info in zf.infolist():
+        if info.filename.endswith("conversations.json"):
+            return info
+    raise ValueError(
+        f"No conversations.json found in {zip_path.name}. "
+        "Expected a claude.ai data export ZIP."
+    )
+
+
 def load_web_export(zip_path):
     "Load conversations from a claude.ai data export ZIP."
     zip_path = Path(zip_path)
     with zipfile.ZipFile(zip_path) as zf:
-        # Search for conversations.json anywhere in the archive
-        conversations_path = None
-        for info in zf.infolist():
-            if info.filename.endswith("conversations.json"):
-                conversations_path = info
-                break
-
-        if conversations_path is None:
-            raise ValueError(
-                f"No conversations.json found in {zip_path.name}. "
-                "Expected a claude.ai data export ZIP."
-            )
+        conversations_path = _find_conversations_json(zf, zip_path)
 
         # Check uncompressed size before loading
         if conversations_path.file_size > MAX_ZIP_ENTRY_BYTES:
-            size_mb = conversations_path.file_size / (1024 * 1024)
-            limit_mb = MAX_ZIP_ENTRY_BYTES / (1024 * 1024)
-            raise ValueError(
-                f"conversations.json is {size_mb:.0f} MB, "
-                f"exceeds {limit_mb:.0f} MB limit"
-            )
+            raise _too_large(conversations_path.file_size)
+
+        data = zf.read(conversations_path)
+    try:
+        return _json_loads(data)
+    except ValueError:
+        return json.loads(data)
+
+
+def _too_large(size):
+    size_mb = size / (1024 * 1024)
+    limit_mb = MAX_ZIP_ENTRY_BYTES / (1024 * 1024)
+    return ValueError(
+        f"conversations.json is {size_mb:.0f} MB, exceeds {limit_mb:.0f} MB limit"
+    )
+
+
+class _LimitedReader:
+    "File wrapper that raises ValueError once more than limit bytes are read."
+
+    def __init__(self, f, limit):
+        self.f = f
+        self.limit = limit
+        self.count = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.count += len(data)
+        if self.count > self.limit:
+            raise _too_large(self.count)
+        return data
 
+
+def iter_web_export(zip_path):
+    """Yield conversations from a claude.ai data export ZIP one at a time.
+
+    With ijson installed, conversations.json is streamed straight out of
+    the archive, so memory use stays flat. Either way a conversations.json
+    over MAX_ZIP_ENTRY_BYTES is rejected before the first conversation is
+    yielded. Without ijson this falls back to load_web_export().
+    """
+    if ijson is None:
+        yield from load_web_export(zip_path)
+        return
+    zip_path = Path(zip_path)
+    with zipfile.ZipFile(zip_path) as zf:
+        conversations_path = _find_conversations_json(zf, zip_path)
+
+        # Check uncompressed size before streaming
+        if conversations_path.file_size > MAX_ZIP_ENTRY_BYTES:
+            raise _too_large(conversations_path.file_size)
+
+        # Backstop in case the header understates what is decompressed
         with zf.open(conversations_path) as f:
-            return json.load(f)
+            reader = _LimitedReader(f, MAX_ZIP_ENTRY_BYTES)
+            yield from ijson.items(reader, "item", use_float=True)
+
+
+# claude.ai sender names mapped to standard roles; others pass through
+_WEB_ROLES = {"human": "user", "assistant": "assistant"}
 
 
-def process_web_conversation(conversation, zip_path=None):
-    "Process a single conversation from a claude.ai web export."
+def process_web_conversation(conversation, zip_path=None, file_size=None):
+    """Process a single conversation from a claude.ai web export.
+
+    file_size is the size of zip_path, if known; callers processing a
+    whole export pass it in so the ZIP isn't stat()ed per conversation.
+    """
     session_id = conversation.get("uuid", "")
     name = conversation.get("name", "")
     summary_text = conversation.get("summary", "")
     created_at = conversation.get("created_at")
     updated_at = conversation.get("updated_at")
-    chat_messages = conversation.get("chat_messages", [])
+    chat_messages = conversation.get("chat_messages", ())
 
     if not chat_messages:
         return None, []
 
     message_rows = []
-    timestamps = []
+    start_time = None
+    end_time = None
+    user_count = 0
+    assistant_count = 0
 
     for msg_index, msg in enumerate(chat_messages):
         sender = msg.get("sender", "unknown")
         # Map claude.ai roles to standard roles
-        role = {"human": "user", "assistant": "assistant"}.get(sender, sender)
+        role = _intern(_WEB_ROLES.get(sender, sender))
 
         # Content: try structured content blocks first, fall back to text
         raw_content = msg.get("content")
         text_field = msg.get("text", "")
 
         if isinstance(raw_content, list) and raw_content:
-            content_text = extract_text(raw_content)
-            thinking = extract_thinking(raw_content)
+            content_text, thinking, _, _, _ = extract_all(
+                raw_content, limit=MAX_CONTENT_CHARS
+            )
         else:
             content_text = text_field or ""
             thinking = None
 
         ts = msg.get("created_at")
         if ts:
-            timestamps.append(ts)
+            if start_time is None or ts < start_time:
+                start_time = ts
+            if end_time is None or ts > end_time:
+                end_time = ts
+        if role == "user":
+            user_count += 1
+        elif role == "assistant":
+            assistant_count += 1
 
         message_rows.append({
             "session_id": session_id,
             "message_index": msg_index,
             "role": role,
-            "content": content_text[:100_000] if content_text else "",
-            "thinking": thinking[:100_000] if thinking else None,
+            "content": content_text[:MAX_CONTENT_CHARS] if content_text else "",
+            "thinking": thinking[:MAX_CONTENT_CHARS] if thinking else None,
             "timestamp": ts,
             "uuid": msg.get("uuid"),
             "parent_uuid": None,
@@ -458,6 +688,9 @@ def process_web_conversation(conversation, zip_path=None):
             "duration_ms": None,
         })
 
+    if file_size is None and zip_path:
+        file_size = Path(zip_path).stat().st_size
+
     session_row = {
         "session_id": session_id,
         "project": None,
@@ -467,16 +700,16 @@ def process_web_conversation(conversation, zip_path=None):
         "models": None,
         "summary": summary_text or None,
         "custom_title": name or None,
-        "start_time": min(timestamps) if timestamps else created_at,
-        "end_time": max(timestamps) if timestamps else updated_at,
+        "start_time": start_time if start_time is not None else created_at,
+        "end_time": end_time if end_time is not None else updated_at,
         "message_count": len(message_rows),
-        "user_message_count": sum(1 for m in message_rows if m["role"] == "user"),
-        "assistant_message_count": sum(1 for m in message_rows if m["role"] == "assistant"),
+        "user_message_count": user_count,
+        "assistant_message_count": assistant_count,
         "total_input_tokens": 0,
         "total_output_tokens": 0,
         "total_tokens": 0,
         "file_path": str(zip_path) if zip_path else None,
-        "file_size_bytes": Path(zip_path).stat().st_size if zip_path else None,
+        "file_size_bytes": file_size,
         "source": "web",
     }
 
@@ -531,24 +764,182 @@ MESSAGES_COLUMNS = {
 }
 
 
-def save_session(db, session_row, message_rows):
-    "Save a session and its messages to the database."
-    db["sessions"].insert(
-        session_row,
-        pk="session_id",
-        columns=SESSIONS_COLUMNS,
-        alter=True,
-        replace=True,
+def _insert_sql(table, columns):
+    "Build an INSERT OR REPLACE statement binding every column in order."
+    return "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+        table,
+        ", ".join(f'"{column}"' for column in columns),
+        ", ".join("?" for _ in columns),
     )
-    if message_rows:
-        db["messages"].insert_all(
-            message_rows,
-            pk=("session_id", "message_index"),
-            foreign_keys=[("session_id", "sessions", "session_id")],
-            columns=MESSAGES_COLUMNS,
-            alter=True,
+
+
+SESSIONS_INSERT_SQL = _insert_sql("sessions", SESSIONS_COLUMNS)
+MESSAGES_INSERT_SQL = _insert_sql("messages", MESSAGES_COLUMNS)
+
+# Pull a row's values out in column order
+_session_values = itemgetter(*SESSIONS_COLUMNS)
+_message_values = itemgetter(*MESSAGES_COLUMNS)
+
+
+INGESTED_FILES_COLUMNS = {
+    "path": str,
+    "size": int,
+    "mtime_ns": int,
+}
+
+
+def load_ingested_files(db):
+    "Return {path: (size, mtime_ns)} for every file recorded as imported."
+    if not db["_ingested_files"].exists():
+        return {}
+    rows = db.execute("SELECT path, size, mtime_ns FROM _ingested_files")
+    return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+
+def record_ingested_files(db, files):
+    "Record (path, size, mtime_ns) tuples for files that imported cleanly."
+    if files:
+        db["_ingested_files"].insert_all(
+            (
+                {"path": path, "size": size, "mtime_ns": mtime_ns}
+                for path, size, mtime_ns in files
+            ),
+            pk="path",
+            columns=INGESTED_FILES_COLUMNS,
             replace=True,
         )
+
+
+def record_errors(db, command, errors):
+    """Replace the _errors rows for command with this run's (item, error) tuples.
+
+    item is the file path or conversation UUID that failed to import.
+    """
+    table = db["_errors"]
+    with db.conn:
+        if table.exists():
+            db.execute("DELETE FROM _errors WHERE command = ?", [command])
+        if errors:
+            table.insert_all(
+                (
+                    {"command": command, "item": item, "error": error}
+                    for item, error in errors
+                ),
+                columns={"command": str, "item": str, "error": str},
+            )
+
+
+def _row_params(rows, values, columns, coerce=False):
+    """Convert row dicts to parameter tuples, using values when every key is set.
+
+    coerce=True JSON-encodes dicts and lists the way sqlite-utils does, for
+    records that carry non-scalar values in fields copied straight across.
+    """
+    try:
+        params = list(map(values, rows))
+    except KeyError:
+        # Rows built outside process_session may leave columns out
+        params = [tuple(row.get(c) for c in columns) for row in rows]
+    if coerce:
+        params = [tuple(map(jsonify_if_needed, p)) for p in params]
+    return params
+
+
+def _insert_rows(db, sql, rows, values, columns):
+    "executemany sql over rows, retrying with coerced values if binding fails."
+    try:
+        db.conn.executemany(sql, _row_params(rows, values, columns))
+    except (sqlite3.InterfaceError, sqlite3.ProgrammingError):
+        # Rows already written re-run harmlessly: the SQL is INSERT OR REPLACE
+        db.conn.executemany(sql, _row_params(rows, values, columns, coerce=True))
+
+
+# Connection settings that also help read-only queries such as stats
+READ_PRAGMAS = (
+    "cache_size=-262144",
+    "mmap_size=268435456",
+    "temp_store=MEMORY",
+)
+
+
+def tune_db(db):
+    "Switch the database to WAL with relaxed syncing for faster bulk imports."
+    db.enable_wal()
+    db.execute("PRAGMA synchronous=NORMAL")
+    for pragma in READ_PRAGMAS:
+        db.execute(f"PRAGMA {pragma}")
+
+
+def open_db(db_path, readonly=False):
+    """Open db_path as a sqlite_utils Database with tuned PRAGMAs.
+
+    readonly=True opens the file with mode=ro, which never takes a write
+    lock, and only applies the read-side settings.
+    """
+    if not readonly:
+        db = sqlite_utils.Database(db_path)
+        tune_db(db)
+        return db
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    db = sqlite_utils.Database(sqlite3.connect(uri, uri=True))
+    for pragma in READ_PRAGMAS:
+        db.execute(f"PRAGMA {pragma}")
+    return db
+
+
+def ensure_tables(db):
+    "Create the sessions and messages tables, or add any columns they lack."
+    tables = [
+        ("sessions", SESSIONS_COLUMNS, "session_id", None),
+        (
+            "messages",
+            MESSAGES_COLUMNS,
+            ("session_id", "message_index"),
+            [("session_id", "sessions", "session_id")],
+        ),
+    ]
+    for name, columns, pk, foreign_keys in tables:
+        table = db[name]
+        if not table.exists():
+            table.create(columns, pk=pk, foreign_keys=foreign_keys)
+            continue
+        existing = table.columns_dict
+        for column, column_type in columns.items():
+            if column not in existing:
+                table.add_column(column, column_type)
+
+
+def save_sessions(db, session_rows, message_rows):
+    "Save a batch of sessions and all of their messages in one transaction."
+    # Check the schema once per batch; the inserts assume every column exists
+    ensure_tables(db)
+    with db.conn:
+        # Take the write lock up front instead of upgrading a read lock
+        # halfway through, which can fail with SQLITE_BUSY under readers
+        if not db.conn.in_transaction:
+            db.conn.execute("BEGIN IMMEDIATE")
+        # Skip sqlite-utils' per-call SQL building: sqlite3 caches these
+        # prepared statements on the connection and reuses them per batch
+        _insert_rows(
+            db,
+            SESSIONS_INSERT_SQL,
+            session_rows,
+            _session_values,
+            SESSIONS_COLUMNS,
+        )
+        if message_rows:
+            _insert_rows(
+                db,
+                MESSAGES_INSERT_SQL,
+                message_rows,
+                _message_values,
+                MESSAGES_COLUMNS,
+            )
+
+
+def save_session(db, session_row, message_rows):
+    "Save a session and its messages to the database."
+    save_sessions(db, [session_row], message_rows)
     return session_row["session_id"]
 
 
@@ -643,6 +1034,23 @@ VIEWS = {
 }
 
 
+def _fts_trigger_names(table_name):
+    "Names sqlite-utils gives the triggers that keep table_name's FTS in sync."
+    return [f"{table_name}_ai", f"{table_name}_ad", f"{table_name}_au"]
+
+
+def drop_fts_triggers(db):
+    """Drop FTS sync triggers ahead of a bulk import.
+
+    Rows written without them aren't tokenized one by one; ensure_db_shape
+    sees the missing triggers, rebuilds the index in a single pass and
+    puts the triggers back.
+    """
+    for table_name in FTS_CONFIG:
+        for trigger in _fts_trigger_names(table_name):
+            db.execute(f"DROP TRIGGER IF EXISTS [{trigger}]")
+
+
 def ensure_db_shape(db):
     "Set up indexes, FTS, and views after all data is inserted."
     table_names = db.table_names()
@@ -652,17 +1060,27 @@ def ensure_db_shape(db):
             db["messages"].create_index(cols, if_not_exists=True)
 
     if "sessions" in table_names:
-        for cols in [["project"], ["start_time"]]:
+        for cols in [["project"], ["start_time"], ["end_time"]]:
             db["sessions"].create_index(cols, if_not_exists=True)
 
     for table_name, fts_conf in FTS_CONFIG.items():
         fts_table = f"{table_name}_fts"
         current_tables = db.table_names()
-        if table_name in current_tables and fts_table not in current_tables:
-            db[table_name].enable_fts(
-                fts_conf["columns"],
-                create_triggers=fts_conf.get("create_triggers", True),
-            )
+        if table_name not in current_tables:
+            continue
+        create_triggers = fts_conf.get("create_triggers", True)
+        if fts_table in current_tables:
+            if not create_triggers:
+                continue
+            existing = {t.name for t in db[table_name].triggers}
+            if all(n in existing for n in _fts_trigger_names(table_name)):
+                continue
+            # Triggers were dropped for a bulk import: the index is stale
+            db[table_name].disable_fts()
+        db[table_name].enable_fts(
+            fts_conf["columns"],
+            create_triggers=create_triggers,
+        )
 
     current_tables = db.table_names()
     for view_name, view_conf in VIEWS.items():
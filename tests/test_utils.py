@@ -1,5 +1,6 @@
 "Tests for claude_code_to_sqlite."
 import json
+import sqlite3
 import zipfile
 from pathlib import Path
 
@@ -23,8 +24,7 @@ def db():
 
 def write_jsonl(path, records):
     with open(path, "w", encoding="utf-8") as f:
-        for rec in records:
-            f.write(json.dumps(rec) + "\n")
+        f.write("".join(json.dumps(rec) + "\n" for rec in records))
 
 
 def make_cli_session(tmp_dir, session_id="abc-123", messages=None):
@@ -293,6 +293,12 @@ class TestFileFiltering:
         files = utils.collect_session_files(tmp_dir, include_agents=True)
         assert len(files) == 2
 
+    def test_should_skip_file_accepts_str(self):
+        assert utils.should_skip_file("proj/subagents/s.jsonl")
+        assert utils.should_skip_file("proj/agent-1.jsonl")
+        assert not utils.should_skip_file("proj/agent-1.jsonl", include_agents=True)
+        assert not utils.should_skip_file("proj/s.jsonl")
+
     def test_skip_backup_files(self, tmp_dir):
         (tmp_dir / "session.jsonl.backup").touch()
         (tmp_dir / "session.jsonl").touch()
@@ -320,6 +326,33 @@ class TestFileFiltering:
         files = utils.collect_session_files(tmp_dir)
         assert len(files) == 2
 
+    def test_nested_files_in_sorted_order(self, tmp_dir):
+        for rel in ["b/2.jsonl", "a/z.jsonl", "a/b/1.jsonl", "c.json"]:
+            path = tmp_dir / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+        files = utils.collect_session_files(tmp_dir)
+        assert files == sorted(files)
+        assert [f.relative_to(tmp_dir).as_posix() for f in files] == [
+            "a/b/1.jsonl", "a/z.jsonl", "b/2.jsonl", "c.json",
+        ]
+
+    def test_project_from_top_level_directory(self, tmp_dir):
+        nested = tmp_dir / "-home-user-app" / "nested"
+        nested.mkdir(parents=True)
+        (nested / "a.jsonl").touch()
+        (tmp_dir / "-home-user-app" / "b.jsonl").touch()
+        (tmp_dir / "loose.jsonl").touch()
+        found = [
+            (f.name, project)
+            for f, project in utils.iter_project_session_files(tmp_dir)
+        ]
+        assert found == [
+            ("b.jsonl", "/home/user/app"),
+            ("a.jsonl", "/home/user/app"),
+            ("loose.jsonl", "default"),
+        ]
+
     def test_skip_metadata_files(self, tmp_dir):
         """sessions-index.json and timeline.json are metadata, not sessions."""
         (tmp_dir / "sessions-index.json").touch()
@@ -389,6 +422,28 @@ class TestContentExtraction:
         assert calls[0]["name"] == "Read"
         assert calls[1]["name"] == "Bash"
 
+    def test_extract_all(self):
+        blocks = [
+            {"type": "thinking", "thinking": "hmm"},
+            {"type": "text", "text": "Running it."},
+            {"type": "tool_use", "id": "c1", "name": "Bash", "input": {"cmd": "ls"}},
+            {"type": "tool_result", "tool_use_id": "c0", "content": "ok"},
+        ]
+        text, thinking, calls, tool_use_id, is_tool_result = utils.extract_all(blocks)
+        assert text == "Running it.\n[tool_use: Bash]\nok"
+        assert thinking == "hmm"
+        assert [c["name"] for c in calls] == ["Bash"]
+        assert tool_use_id == "c0"
+        assert is_tool_result is True
+        _, thinking, calls, _, is_tool_result = utils.extract_all(blocks, role="user")
+        assert (thinking, len(calls), is_tool_result) == (None, 1, True)
+
+    def test_extract_all_limit(self):
+        blocks = [{"type": "text", "text": "x" * 60}] * 5
+        text, _, _, _, _ = utils.extract_all(blocks, limit=100)
+        assert len(text) == 100
+        assert text[:100] == utils.extract_text(blocks)[:100]
+
     def test_replace_base64_content(self):
         long_b64 = "data:image/png;base64," + "A" * 2000
         result = utils.replace_base64_content(long_b64)
@@ -448,6 +503,56 @@ class TestCLISessionProcessing:
         assert session["start_time"] == "2025-06-15T10:00:00Z"
         assert session["end_time"] == "2025-06-15T10:00:05Z"
 
+    def test_timestamps_out_of_order(self, tmp_dir):
+        records = [
+            {"type": "user", "sessionId": "t1", "timestamp": ts, "message": {"role": "user", "content": "hi"}}
+            for ts in ("2025-06-15T10:00:05Z", "2025-06-15T09:00:00Z", "2025-06-15T11:00:00Z")
+        ]
+        filepath = tmp_dir / "t1.jsonl"
+        write_jsonl(filepath, records)
+        session, _, _ = utils.process_session(filepath)
+        assert session["start_time"] == "2025-06-15T09:00:00Z"
+        assert session["end_time"] == "2025-06-15T11:00:00Z"
+        assert session["user_message_count"] == 3
+
+    def test_json_columns_keep_default_separators(self, tmp_dir):
+        """tool_names/models keep json.dumps' '["A", "B"]' text format."""
+        records = [
+            {"type": "assistant", "sessionId": "sep", "message": {
+                "role": "assistant", "model": model,
+                "content": [
+                    {"type": "tool_use", "id": "a", "name": "Read", "input": {}},
+                    {"type": "tool_use", "id": "b", "name": "Bash", "input": {}},
+                ],
+            }}
+            for model in ("model-b", "model-a")
+        ]
+        filepath = tmp_dir / "sep.jsonl"
+        write_jsonl(filepath, records)
+        session, messages, _ = utils.process_session(filepath)
+        assert messages[0]["tool_names"] == '["Read", "Bash"]'
+        assert session["models"] == '["model-a", "model-b"]'
+
+    def test_tool_metadata_for_any_role(self, tmp_dir):
+        """Tool calls and results are recorded whatever the message role."""
+        records = [
+            {"type": "system", "sessionId": "roles", "content": [
+                {"type": "tool_result", "tool_use_id": "t1", "content": "ok"},
+                {"type": "tool_use", "id": "t2", "name": "Bash", "input": {}},
+            ]},
+            {"type": "user", "sessionId": "roles", "message": {"role": "user", "content": [
+                {"type": "tool_use", "id": "t3", "name": "Read", "input": {}},
+            ]}},
+        ]
+        filepath = tmp_dir / "roles.jsonl"
+        write_jsonl(filepath, records)
+        _, messages, _ = utils.process_session(filepath)
+        assert messages[0]["role"] == "system"
+        assert messages[0]["tool_use_id"] == "t1"
+        assert messages[0]["is_tool_result"] is True
+        assert messages[0]["tool_names"] == '["Bash"]'
+        assert messages[1]["tool_names"] == '["Read"]'
+
     def test_message_counts(self, tmp_dir):
         filepath = make_cli_session(tmp_dir)
         session, _, _ = utils.process_session(filepath)
@@ -498,6 +603,52 @@ class TestCLISessionProcessing:
         assert len(messages) == 1
         assert messages[0]["role"] == "user"
 
+    def test_snapshot_metadata_ignored(self, tmp_dir):
+        records = [
+            # type isn't the first key, so this line is parsed, not skipped
+            {
+                "sessionId": "from-snapshot",
+                "type": "file-history-snapshot",
+                "cwd": "/snapshot",
+                "timestamp": "2025-06-15T09:00:00Z",
+                "snapshot": {"x": 1},
+            },
+            {
+                "type": "user",
+                "sessionId": "snap-meta",
+                "cwd": "/home/user/app",
+                "timestamp": "2025-06-15T10:00:00Z",
+                "message": {"role": "user", "content": "hello"},
+            },
+        ]
+        filepath = tmp_dir / "snap-meta.jsonl"
+        write_jsonl(filepath, records)
+        session, _, _ = utils.process_session(filepath)
+        # Same result as when the snapshot line is skipped unparsed
+        assert session["session_id"] == "snap-meta"
+        assert session["cwd"] == "/home/user/app"
+        assert session["start_time"] == "2025-06-15T10:00:00Z"
+
+    def test_snapshot_lines_not_parsed(self, tmp_dir):
+        snapshot = json.dumps({"type": "file-history-snapshot", "snapshot": {"x": 1}})
+        user = json.dumps({"type": "user", "sessionId": "s", "message": {"role": "user", "content": "hi"}})
+        filepath = tmp_dir / "snap.jsonl"
+        filepath.write_text(snapshot + "\n" + snapshot[:-1] + user + "\n")
+        records, warnings = utils.load_session_file(filepath)
+        assert records[0] == {"type": "file-history-snapshot"}
+        # A record concatenated onto a snapshot is still recovered
+        assert records[-1]["type"] == "user"
+        assert warnings == []
+
+    def test_truncated_snapshot_line_warns(self, tmp_dir):
+        snapshot = json.dumps({"type": "file-history-snapshot", "snapshot": {"x": 1}})
+        filepath = tmp_dir / "snap.jsonl"
+        filepath.write_text(snapshot[:-5] + "\n")
+        records, warnings = utils.load_session_file(filepath)
+        assert records == []
+        assert len(warnings) == 1
+        assert "unrecoverable JSON parse error" in warnings[0]
+
     def test_custom_title_not_in_messages(self, tmp_dir):
         """custom-title records should set the title, not create a message."""
         records = [
@@ -550,6 +701,16 @@ class TestCLISessionProcessing:
         assert "unrecoverable JSON parse error" in warnings[0]
         assert "line 3" in warnings[1]
 
+    def test_extract_records_from_bad_line(self):
+        first = json.dumps({"parentUuid": None, "type": "user"})
+        second = json.dumps({"type": "assistant"})
+        line = first[:-1] + second + '{"type": "truncated'
+        records = utils._extract_records_from_bad_line(line)
+        assert records == [{"type": "assistant"}]
+        assert utils._extract_records_from_bad_line(first + second) == [
+            json.loads(first), json.loads(second),
+        ]
+
 
 # --- Tests: Browser export processing ---
 
@@ -586,6 +747,45 @@ class TestWebExportProcessing:
         conversations = utils.load_web_export(zip_path)
         assert len(conversations) == 2
 
+    def test_iter_web_export(self, tmp_dir):
+        zip_path = make_web_export_zip(tmp_dir)
+        uuids = [conv["uuid"] for conv in utils.iter_web_export(zip_path)]
+        assert uuids == ["web-conv-001", "web-conv-002"]
+
+    def test_iter_web_export_streams_with_ijson(self, tmp_dir):
+        pytest.importorskip("ijson")
+        zip_path = make_web_export_zip(tmp_dir)
+        direct = utils.load_web_export(zip_path)
+        assert list(utils.iter_web_export(zip_path)) == direct
+
+    def test_iter_web_export_without_ijson(self, tmp_dir, monkeypatch):
+        monkeypatch.setattr(utils, "ijson", None)
+        zip_path = make_web_export_zip(tmp_dir)
+        uuids = [conv["uuid"] for conv in utils.iter_web_export(zip_path)]
+        assert uuids == ["web-conv-001", "web-conv-002"]
+
+    def test_iter_web_export_size_limit(self, tmp_dir, monkeypatch):
+        pytest.importorskip("ijson")
+        monkeypatch.setattr(utils, "MAX_ZIP_ENTRY_BYTES", 100)
+        zip_path = make_web_export_zip(tmp_dir)
+        with pytest.raises(ValueError, match="exceeds 0 MB limit"):
+            list(utils.iter_web_export(zip_path))
+
+    def test_limited_reader_backstop(self):
+        import io
+
+        reader = utils._LimitedReader(io.BytesIO(b"x" * 10), 8)
+        assert reader.read(5) == b"xxxxx"
+        with pytest.raises(ValueError, match="exceeds"):
+            reader.read(5)
+
+    def test_iter_web_export_missing_conversations(self, tmp_dir):
+        zip_path = tmp_dir / "other.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            zf.writestr("users.json", "{}")
+        with pytest.raises(ValueError, match="No conversations.json"):
+            list(utils.iter_web_export(zip_path))
+
     def test_process_web_conversation(self, tmp_dir):
         zip_path = make_web_export_zip(tmp_dir)
         conversations = utils.load_web_export(zip_path)
@@ -669,6 +869,23 @@ class TestSQLiteInsertion:
         assert db["sessions"].count == 2
         assert db["messages"].count == 4
 
+    def test_save_sessions_batch(self, db, tmp_dir):
+        f1 = make_cli_session(tmp_dir, session_id="sess-1")
+        f2 = make_cli_session(tmp_dir, session_id="sess-2")
+        s1, m1, _ = utils.process_session(f1)
+        s2, m2, _ = utils.process_session(f2)
+        utils.save_sessions(db, [s1, s2], m1 + m2)
+        assert db["sessions"].count == 2
+        assert db["messages"].count == 4
+
+    def test_save_sessions_rolls_back_on_error(self, db, tmp_dir, monkeypatch):
+        session, messages, _ = utils.process_session(make_cli_session(tmp_dir))
+        monkeypatch.setattr(utils, "MESSAGES_INSERT_SQL", "INSERT INTO nope VALUES (?)")
+        with pytest.raises(sqlite3.OperationalError):
+            utils.save_sessions(db, [session], messages)
+        assert not db.conn.in_transaction
+        assert db["sessions"].count == 0
+
     def test_mixed_sources(self, db, tmp_dir):
         cli_file = make_cli_session(tmp_dir, session_id="cli-1")
         browser_file = make_browser_session(tmp_dir, session_id="browser-1")
@@ -679,6 +896,68 @@ class TestSQLiteInsertion:
         sources = {row["source"] for row in db["sessions"].rows}
         assert sources == {"cli", "browser"}
 
+    def test_save_tool_result_flags(self, db, tmp_dir):
+        filepath = make_cli_session_with_tools(tmp_dir)
+        session, messages, _ = utils.process_session(filepath)
+        utils.save_session(db, session, messages)
+        rows = list(db["messages"].rows_where(order_by="message_index"))
+        assert [r["is_tool_result"] for r in rows] == [0, 0, 1]
+        assert rows[2]["tool_use_id"] == "call_001"
+
+    def test_save_messages_with_missing_keys(self, db):
+        session = {"session_id": "partial", "source": "cli"}
+        messages = [{"session_id": "partial", "message_index": 0, "content": "hi"}]
+        utils.save_session(db, session, messages)
+        row = list(db["messages"].rows)[0]
+        assert row["content"] == "hi"
+        assert row["role"] is None
+
+    def test_save_messages_with_non_scalar_fields(self, db, tmp_dir):
+        """Dicts/lists copied from records are stored as JSON, not rejected."""
+        records = [{
+            "type": "user", "sessionId": "odd", "uuid": {"weird": 1},
+            "stopReason": ["end"], "message": {"role": "user", "content": "hi"},
+        }]
+        filepath = tmp_dir / "odd.jsonl"
+        write_jsonl(filepath, records)
+        session, messages, _ = utils.process_session(filepath)
+        utils.save_session(db, session, messages)
+        row = list(db["messages"].rows)[0]
+        assert row["uuid"] == '{"weird": 1}'
+        assert row["stop_reason"] == '["end"]'
+
+    def test_save_sessions_with_non_scalar_fields(self, db, tmp_dir):
+        records = [{
+            "type": "user", "sessionId": "odd", "cwd": {"weird": 1},
+            "version": ["1"], "message": {"role": "user", "content": "hi"},
+        }]
+        filepath = tmp_dir / "odd.jsonl"
+        write_jsonl(filepath, records)
+        session, messages, _ = utils.process_session(filepath)
+        utils.save_session(db, session, messages)
+        row = db["sessions"].get("odd")
+        assert row["cwd"] == '{"weird": 1}'
+        assert row["client_version"] == '["1"]'
+
+    def test_save_adds_missing_columns(self, db, tmp_dir):
+        db["sessions"].create({"session_id": str, "project": str}, pk="session_id")
+        filepath = make_cli_session(tmp_dir)
+        session, messages, _ = utils.process_session(filepath)
+        utils.save_session(db, session, messages)
+        assert set(utils.SESSIONS_COLUMNS) <= set(db["sessions"].columns_dict)
+        assert list(db["sessions"].rows)[0]["source"] == "cli"
+
+    def test_open_db_readonly(self, tmp_dir):
+        db_path = str(tmp_dir / "test.db")
+        db = utils.open_db(db_path)
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        db["sessions"].insert({"session_id": "s1"}, pk="session_id")
+        db.conn.close()
+        ro = utils.open_db(db_path, readonly=True)
+        assert ro["sessions"].count == 1
+        with pytest.raises(sqlite3.OperationalError):
+            ro["sessions"].insert({"session_id": "s2"})
+
     def test_ensure_db_shape_creates_indexes(self, db, tmp_dir):
         filepath = make_cli_session(tmp_dir)
         session, messages, _ = utils.process_session(filepath)
@@ -687,6 +966,10 @@ class TestSQLiteInsertion:
         msg_indexes = [idx.columns for idx in db["messages"].indexes]
         assert ["session_id"] in msg_indexes
         assert ["role"] in msg_indexes
+        assert ["model"] in msg_indexes
+        session_indexes = [idx.columns for idx in db["sessions"].indexes]
+        for cols in (["project"], ["start_time"], ["end_time"]):
+            assert cols in session_indexes
 
     def test_ensure_db_shape_creates_fts(self, db, tmp_dir):
         filepath = make_cli_session(tmp_dir)
@@ -722,6 +1005,22 @@ class TestSQLiteInsertion:
         matched_content = [r[0] for r in results]
         assert any("help" in c.lower() for c in matched_content)
 
+    def test_fts_rebuilt_after_dropping_triggers(self, db, tmp_dir):
+        filepath = make_cli_session(tmp_dir)
+        session, messages, _ = utils.process_session(filepath)
+        utils.save_session(db, session, messages)
+        utils.ensure_db_shape(db)
+        utils.drop_fts_triggers(db)
+        assert db["messages"].triggers == []
+        messages[0]["content"] = "zebra crossing"
+        utils.save_session(db, session, messages)
+        utils.ensure_db_shape(db)
+        assert len(db["messages"].triggers) == 3
+        matches = db.execute(
+            "SELECT count(*) FROM messages_fts WHERE messages_fts MATCH 'zebra'"
+        ).fetchone()[0]
+        assert matches == 1
+
 
 # --- Tests: Edge cases ---
 
@@ -806,7 +1105,7 @@ class TestCLICommands:
         runner = CliRunner()
         result = runner.invoke(cli, ["sessions", db_path, str(tmp_dir)])
         assert result.exit_code == 0
-        assert "1 sessions" in result.output
+        assert "1 sessions, 2 messages" in result.output
 
         db = sqlite_utils.Database(db_path)
         assert db["sessions"].count == 1
@@ -824,6 +1123,82 @@ class TestCLICommands:
         assert result.exit_code != 0
         assert "No session files found" in result.output
 
+    def test_small_import_keeps_fts_triggers(self, tmp_dir, monkeypatch):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        db_path = str(tmp_dir / "test.db")
+        db = sqlite_utils.Database(db_path)
+        for i in range(20):
+            filepath = make_cli_session(tmp_dir, session_id=f"old-{i}")
+            session, messages, _ = utils.process_session(filepath)
+            utils.save_session(db, session, messages)
+            filepath.unlink()
+        utils.ensure_db_shape(db)
+
+        dropped = []
+        monkeypatch.setattr(utils, "drop_fts_triggers", dropped.append)
+        project_dir = tmp_dir / "-home-user-myapp"
+        project_dir.mkdir()
+        make_cli_session(project_dir, session_id="new-1")
+        runner = CliRunner()
+        result = runner.invoke(cli, ["sessions", db_path, str(tmp_dir)])
+        assert result.exit_code == 0
+        # One new session next to 20 existing ones: triggers beat a rebuild
+        assert dropped == []
+        assert db["sessions"].count == 21
+
+    def test_failed_import_restores_fts_triggers(self, tmp_dir, monkeypatch):
+        import itertools
+        from click.testing import CliRunner
+        from claude_code_to_sqlite import cli as cli_module
+
+        real = cli_module._process_conversations
+
+        def failing(conversations, zip_path, workers=1):
+            yield from itertools.islice(real(conversations, zip_path), 1)
+            raise RuntimeError("disk on fire")
+
+        monkeypatch.setattr(cli_module, "SAVE_BATCH_SIZE", 1)
+        monkeypatch.setattr(cli_module, "_process_conversations", failing)
+        zip_path = make_web_export_zip(tmp_dir)
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(
+            cli_module.cli, ["web-export", db_path, str(zip_path), "--silent"]
+        )
+        assert isinstance(result.exception, RuntimeError)
+        db = sqlite_utils.Database(db_path)
+        assert db["sessions"].count == 1
+        assert len(db["messages"].triggers) == 3
+        matches = db.execute(
+            "SELECT count(*) FROM messages_fts WHERE messages_fts MATCH 'diagnose'"
+        ).fetchone()[0]
+        assert matches == 1
+
+    def test_web_export_too_large(self, tmp_dir, monkeypatch):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        monkeypatch.setattr(utils, "MAX_ZIP_ENTRY_BYTES", 100)
+        zip_path = make_web_export_zip(tmp_dir)
+        db_path = tmp_dir / "test.db"
+        runner = CliRunner()
+        result = runner.invoke(cli, ["web-export", str(db_path), str(zip_path)])
+        assert result.exit_code == 1
+        assert "exceeds 0 MB limit" in result.output
+        assert not db_path.exists()
+
+    def test_sessions_negative_limit_rejected(self, tmp_dir):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(cli, ["sessions", db_path, str(tmp_dir), "--limit", "-1"])
+        assert result.exit_code == 2
+        assert "Invalid value for '--limit'" in result.output
+
     def test_session_command(self, tmp_dir):
         from click.testing import CliRunner
         from claude_code_to_sqlite.cli import cli
@@ -850,11 +1225,29 @@ class TestCLICommands:
         runner = CliRunner()
         result = runner.invoke(cli, ["web-export", db_path, str(zip_path)])
         assert result.exit_code == 0
-        assert "2 conversations" in result.output
+        assert "2 conversations, 4 messages" in result.output
 
         db = sqlite_utils.Database(db_path)
         assert db["sessions"].count == 2
 
+    def test_web_export_parallel_workers(self, tmp_dir, monkeypatch):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite import cli as cli_module
+
+        monkeypatch.setattr(cli_module, "WEB_EXPORT_CHUNK_SIZE", 1)
+        zip_path = make_web_export_zip(tmp_dir)
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(
+            cli_module.cli, ["web-export", db_path, str(zip_path), "--workers", "2"]
+        )
+        assert result.exit_code == 0
+        assert "2 conversations, 4 messages" in result.output
+        db = sqlite_utils.Database(db_path)
+        assert [r["session_id"] for r in db["sessions"].rows] == [
+            "web-conv-001", "web-conv-002",
+        ]
+
     def test_stats_command(self, tmp_dir):
         from click.testing import CliRunner
         from claude_code_to_sqlite.cli import cli
@@ -869,8 +1262,10 @@ class TestCLICommands:
         runner = CliRunner()
         result = runner.invoke(cli, ["stats", db_path])
         assert result.exit_code == 0
-        assert "Sessions:" in result.output
-        assert "Messages:" in result.output
+        assert "Sessions:  1" in result.output
+        assert "Messages:  2" in result.output
+        assert "Tokens:    150" in result.output
+        assert "Date range: 2025-06-15 to 2025-06-15" in result.output
 
     def test_stats_command_no_sessions_table(self, tmp_dir):
         from click.testing import CliRunner
@@ -928,6 +1323,164 @@ class TestCLICommands:
         assert result.exit_code != 0
         assert "No session files" in result.output
 
+    def test_sessions_parallel_workers(self, tmp_dir):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        for i in range(4):
+            d = tmp_dir / f"-home-user-app{i}"
+            d.mkdir()
+            make_cli_session(d, session_id=f"session-{i}")
+
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(
+            cli, ["sessions", db_path, str(tmp_dir), "--workers", "2"]
+        )
+        assert result.exit_code == 0
+        assert "4 sessions, 8 messages" in result.output
+        db = sqlite_utils.Database(db_path)
+        assert db["sessions"].count == 4
+        assert db["messages"].count == 8
+        projects = {row["project"] for row in db["sessions"].rows}
+        assert projects == {f"/home/user/app{i}" for i in range(4)}
+
+    def test_shared_session_id_resolved_by_path_order(self, tmp_dir, monkeypatch):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite import cli as cli_module
+
+        project_dir = tmp_dir / "-home-user-myapp"
+        project_dir.mkdir()
+
+        def records(text, count):
+            return [
+                {
+                    "type": "user",
+                    "sessionId": "shared",
+                    "message": {"role": "user", "content": f"{text} {i}"},
+                }
+                for i in range(count)
+            ]
+
+        # The agent file sorts first and is longer than the main session
+        write_jsonl(project_dir / "agent-a1.jsonl", records("agent", 5))
+        write_jsonl(project_dir / "main.jsonl", records("main", 2))
+
+        outcomes = []
+        for workers, batch_size in [("1", 500), ("1", 1), ("2", 500), ("2", 1)]:
+            monkeypatch.setattr(cli_module, "SAVE_BATCH_SIZE", batch_size)
+            db_path = tmp_dir / f"test-{workers}-{batch_size}.db"
+            result = CliRunner().invoke(
+                cli_module.cli,
+                [
+                    "sessions", str(db_path), str(tmp_dir), "--include-agents",
+                    "--workers", workers, "--silent",
+                ],
+            )
+            assert result.exit_code == 0, result.output
+            db = sqlite_utils.Database(db_path)
+            messages = db["messages"].rows_where(order_by="message_index")
+            outcomes.append((
+                [r["file_path"] for r in db["sessions"].rows],
+                [r["content"] for r in messages],
+            ))
+        assert outcomes[0] == (
+            [str(project_dir / "main.jsonl")], ["main 0", "main 1"]
+        )
+        assert all(outcome == outcomes[0] for outcome in outcomes)
+
+    def test_imap_bounds_tasks_in_flight(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from claude_code_to_sqlite import cli as cli_module
+
+        submitted = []
+
+        def items():
+            for i in range(10):
+                submitted.append(i)
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = cli_module._imap(executor, abs, items(), window=3)
+            assert next(results) == 0
+            assert len(submitted) == 4
+            assert list(results) == list(range(1, 10))
+
+    def test_imap_unordered_yields_finished_tasks_first(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from claude_code_to_sqlite import cli as cli_module
+
+        release = threading.Event()
+
+        def work(i):
+            if i == 0:
+                release.wait(5)
+            return i
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = cli_module._imap(executor, work, range(6), window=3, ordered=False)
+            first = next(results)
+            release.set()
+            rest = list(results)
+        assert first != 0
+        assert sorted([first] + rest) == list(range(6))
+
+    def test_sessions_skips_unchanged_files(self, tmp_dir):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        sessions_dir = tmp_dir / "sessions"
+        sessions_dir.mkdir()
+        make_cli_session(sessions_dir, session_id="sess-1")
+        changed = make_cli_session(sessions_dir, session_id="sess-2")
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(cli, ["sessions", db_path, str(sessions_dir)])
+        assert "2 sessions, 4 messages" in result.output
+
+        result = runner.invoke(cli, ["sessions", db_path, str(sessions_dir)])
+        assert result.exit_code == 0
+        assert "Skipping 2 unchanged files" in result.output
+        assert "0 sessions, 0 messages" in result.output
+
+        with open(changed, "a") as f:
+            f.write("\n")
+        result = runner.invoke(cli, ["sessions", db_path, str(sessions_dir)])
+        assert "Skipping 1 unchanged files" in result.output
+        assert "1 sessions, 2 messages" in result.output
+
+        result = runner.invoke(
+            cli, ["sessions", db_path, str(sessions_dir), "--force"]
+        )
+        assert "Skipping" not in result.output
+        assert "2 sessions, 4 messages" in result.output
+        assert sqlite_utils.Database(db_path)["_ingested_files"].count == 2
+
+    def test_sessions_records_errors(self, tmp_dir):
+        from click.testing import CliRunner
+        from claude_code_to_sqlite.cli import cli
+
+        sessions_dir = tmp_dir / "sessions"
+        sessions_dir.mkdir()
+        make_cli_session(sessions_dir)
+        broken = sessions_dir / "broken.json"
+        broken.write_text("{not json")
+        db_path = str(tmp_dir / "test.db")
+        runner = CliRunner()
+        result = runner.invoke(cli, ["sessions", db_path, str(sessions_dir)])
+        assert result.exit_code != 0
+        assert "1 files had errors" in result.output
+        rows = list(sqlite_utils.Database(db_path)["_errors"].rows)
+        assert [(r["command"], r["item"]) for r in rows] == [
+            ("sessions", str(broken))
+        ]
+
+        broken.unlink()
+        result = runner.invoke(cli, ["sessions", db_path, str(sessions_dir)])
+        assert result.exit_code == 0
+        assert sqlite_utils.Database(db_path)["_errors"].count == 0
+
     def test_sessions_silent(self, tmp_dir):
         from click.testing import CliRunner
         from claude_code_to_sqlite.cli import cli